@@ -0,0 +1,17 @@
+"""
+Build script for the compiled model server.
+
+Compiles src/model_server.py ahead of time with Cython. Python prefers the
+resulting extension module over the .py file, so no imports change, but
+edits to the .py have no effect until it is rebuilt or removed (make clean).
+
+Usage: make compile
+"""
+
+from setuptools import setup
+from Cython.Build import cythonize
+
+setup(
+    packages=[],
+    ext_modules=cythonize(["src/model_server.py"], language_level=3),
+)
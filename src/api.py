@@ -4,29 +4,49 @@ Simple FastAPI for Bank Marketing Prediction
 Minimal API for demo purposes.
 """
 
-from fastapi import FastAPI, HTTPException, File, UploadFile
-from pydantic import BaseModel
-from typing import Dict, Any
+from fastapi import FastAPI, HTTPException, File, UploadFile, Request
+from fastapi.responses import ORJSONResponse, Response
+import msgspec
 import pandas as pd
-import io
-import sys
-from pathlib import Path
+import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import asyncio
+import functools
+from contextlib import asynccontextmanager
 
-# Add project root to path
-project_root = Path(__file__).parent.parent
-sys.path.append(str(project_root))
+from .batching import MicroBatcher
+from .model_server import predictor
 
-from src.model_server import predictor
+# Sample CSV with correct column names for the pipeline, built once at import
+SAMPLE_DATA = {
+    "age": [35, 42, 28],
+    "occupation": ["admin.", "management", "student"],
+    "marital_status": ["married", "single", "married"],
+    "education": ["university.degree", "high.school", "university.degree"],
+    "has_credit": ["no", "no", "yes"],
+    "housing_loan": ["yes", "no", "yes"],
+    "personal_loan": ["no", "yes", "no"],
+    "contact_mode": ["cellular", "telephone", "cellular"],
+    "month": ["may", "nov", "jul"],
+    "week_day": ["thu", "fri", "mon"],
+    "last_contact_duration": [261, 151, 198],
+    "contacts_per_campaign": [1, 2, 1],
+    "N_last_days": [999, 999, 999],
+    "nb_previous_contact": [0, 0, 0],
+    "previous_outcome": ["nonexistent", "nonexistent", "nonexistent"],
+    "emp_var_rate": [1.1, -0.1, 1.4],
+    "cons_price_index": [93.994, 93.200, 94.465],
+    "cons_conf_index": [-36.4, -42.0, -41.8],
+    "euri_3_month": [4.857, 4.191, 4.961],
+    "nb_employees": [5191, 5099, 5228]
+}
 
-# Create FastAPI app
-app = FastAPI(
-    title="Bank Marketing Prediction API",
-    description="Simple API for predicting bank marketing campaign outcomes",
-    version="1.0.0"
-)
+SAMPLE_CSV_BYTES = pd.DataFrame(SAMPLE_DATA).to_csv(index=False).encode()
 
-# Simple request model with proper type validation
-class PredictionRequest(BaseModel):
+# Simple request model with proper type validation (decoded with msgspec,
+# which validates while parsing instead of in a separate Pydantic pass)
+class PredictionRequest(msgspec.Struct):
     """Model for prediction requests with proper field validation."""
     
     # Customer demographics
@@ -57,102 +77,178 @@ class PredictionRequest(BaseModel):
     euri_3_month: float
     nb_employees: float
 
-@app.get("/")
-async def root():
-    """Root endpoint."""
-    return {"message": "Bank Marketing Prediction API", "status": "running"}
+class StrictPredictionRequest(PredictionRequest, forbid_unknown_fields=True):
+    """Prediction request that rejects fields it doesn't declare."""
 
-@app.get("/health")
-async def health_check():
-    """Health check endpoint."""
-    return {"status": "healthy"}
+# JSON schema for /predict, which reads the raw body and so has no schema in
+# OpenAPI otherwise; inlined because msgspec puts the struct under "$defs"
+PREDICTION_REQUEST_SCHEMA = msgspec.json.schema(PredictionRequest)["$defs"]["PredictionRequest"]
 
-@app.post("/predict")
-async def predict(request: PredictionRequest):
-    """Make a single prediction."""
-    try:
-        # Convert request to dictionary
-        input_data = request.dict()
-        
-        # Make prediction
-        result = predictor.predict(input_data)
-        
-        return result
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error making prediction: {str(e)}")
+def read_csv_bytes(contents: bytes) -> pd.DataFrame:
+    """Parse raw CSV bytes with Arrow's multi-threaded reader.
+    
+    Only the columns the pipeline uses are converted; any others in the
+    upload are skipped, since batch responses only carry predictions.
+    """
+    convert_options = pacsv.ConvertOptions(include_columns=predictor.input_columns)
+    table = pacsv.read_csv(pa.BufferReader(contents), convert_options=convert_options)
+    return table.to_pandas()
 
-@app.post("/predict/batch")
-async def predict_batch(file: UploadFile = File(...)):
-    """Make batch predictions from CSV file."""
-    try:
-        # Validate file type
-        if not file.filename.endswith('.csv'):
-            raise HTTPException(status_code=400, detail="Only CSV files are supported")
-        
-        # Read uploaded file
-        contents = await file.read()
-        df = pd.read_csv(io.StringIO(contents.decode('utf-8')))
-        
-        if df.empty:
-            raise HTTPException(status_code=400, detail="Uploaded file is empty")
-        
-        # Make batch predictions
-        results_df = predictor.predict_batch(df)
-        
-        # Convert to JSON-serializable format
-        results = results_df.to_dict('records')
-        
-        return {
-            "message": f"Batch prediction completed for {len(results)} samples",
-            "total_samples": len(results),
-            "predictions": results
-        }
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error processing batch prediction: {str(e)}")
+def read_arrow_bytes(contents: bytes) -> pd.DataFrame:
+    """Read an Arrow IPC (Feather) file from raw bytes."""
+    return pa.ipc.open_file(pa.BufferReader(contents)).read_pandas()
+
+async def run_batch_prediction(df: pd.DataFrame) -> ORJSONResponse:
+    """Run batch predictions on a parsed DataFrame and build the response."""
+    if df.empty:
+        raise HTTPException(status_code=400, detail="Uploaded file is empty")
+    
+    # Make batch predictions in a worker thread to keep the event loop free
+    results_df = await asyncio.to_thread(predictor.predict_batch, df)
+    
+    # Columnar format: numeric columns go to orjson as contiguous numpy arrays
+    # (float32 keeps its short repr), label strings as plain lists
+    results = {
+        col: (np.ascontiguousarray(results_df[col].to_numpy())
+              if results_df[col].dtype.kind in "biuf"
+              else results_df[col].tolist())
+        for col in results_df.columns
+    }
+    
+    # Only prediction columns are returned; the row index lets the client
+    # align them with the rows it uploaded
+    return ORJSONResponse({
+        "message": f"Batch prediction completed for {len(results_df)} samples",
+        "total_samples": len(results_df),
+        "index": results_df.index.tolist(),
+        "predictions": results
+    })
 
-@app.get("/sample-csv/download")
-async def download_sample_csv():
-    """Download a sample CSV file."""
-    try:
-        # Create sample DataFrame with correct column names for the pipeline
-        sample_data = {
-            "age": [35, 42, 28],
-            "occupation": ["admin.", "management", "student"],
-            "marital_status": ["married", "single", "married"],
-            "education": ["university.degree", "high.school", "university.degree"],
-            "has_credit": ["no", "no", "yes"],
-            "housing_loan": ["yes", "no", "yes"],
-            "personal_loan": ["no", "yes", "no"],
-            "contact_mode": ["cellular", "telephone", "cellular"],
-            "month": ["may", "nov", "jul"],
-            "week_day": ["thu", "fri", "mon"],
-            "last_contact_duration": [261, 151, 198],
-            "contacts_per_campaign": [1, 2, 1],
-            "N_last_days": [999, 999, 999],
-            "nb_previous_contact": [0, 0, 0],
-            "previous_outcome": ["nonexistent", "nonexistent", "nonexistent"],
-            "emp_var_rate": [1.1, -0.1, 1.4],
-            "cons_price_index": [93.994, 93.200, 94.465],
-            "cons_conf_index": [-36.4, -42.0, -41.8],
-            "euri_3_month": [4.857, 4.191, 4.961],
-            "nb_employees": [5191, 5099, 5228]
+def create_app(strict_validation: bool = True) -> FastAPI:
+    """Create the FastAPI app.
+    
+    /predict always checks the declared fields. With strict_validation,
+    values must have their declared JSON types and unknown fields are
+    rejected; without it, numeric strings are coerced (like Pydantic's lax
+    mode) and unknown fields are ignored. Both variants share the single
+    module-level predictor, so the model is loaded once.
+    """
+    # Decoder built once, validating while it parses
+    if strict_validation:
+        request_decoder = msgspec.json.Decoder(StrictPredictionRequest, strict=True)
+    else:
+        request_decoder = msgspec.json.Decoder(PredictionRequest, strict=False)
+    
+    # Concurrent /predict requests are coalesced into batched model calls;
+    # cached inputs are answered without queueing, and per-row exceptions
+    # keep one bad input from failing the rest of its batch
+    batcher = MicroBatcher(functools.partial(predictor.predict_many, return_exceptions=True),
+                           lookup=predictor.cached_prediction)
+    
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        await batcher.start()
+        yield
+        await batcher.stop()
+    
+    app = FastAPI(
+        title="Bank Marketing Prediction API",
+        description="Simple API for predicting bank marketing campaign outcomes",
+        version="1.0.0",
+        default_response_class=ORJSONResponse,
+        lifespan=lifespan
+    )
+    
+    @app.get("/")
+    async def root():
+        """Root endpoint."""
+        return {"message": "Bank Marketing Prediction API", "status": "running"}
+    
+    @app.get("/health")
+    async def health_check():
+        """Health check endpoint."""
+        return {"status": "healthy"}
+    
+    @app.post("/predict", openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"schema": PREDICTION_REQUEST_SCHEMA}}
         }
+    })
+    async def predict(request: Request):
+        """Make a single prediction."""
+        try:
+            prediction_request = request_decoder.decode(await request.body())
+            input_data = msgspec.structs.asdict(prediction_request)
+        except msgspec.DecodeError as e:
+            raise HTTPException(status_code=422, detail=f"Invalid prediction request: {str(e)}")
         
-        df = pd.DataFrame(sample_data)
-        csv_content = df.to_csv(index=False)
-        
-        from fastapi.responses import Response
+        try:
+            # Batched with other pending requests, run in a worker thread
+            result = await batcher.submit(input_data)
+            
+            # Return the response directly so orjson serializes the numpy values
+            return ORJSONResponse(result)
+            
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error making prediction: {str(e)}")
+    
+    @app.post("/predict/batch")
+    async def predict_batch(file: UploadFile = File(...)):
+        """Make batch predictions from CSV file."""
+        try:
+            # Validate file type
+            if not file.filename.endswith('.csv'):
+                raise HTTPException(status_code=400, detail="Only CSV files are supported")
+            
+            # Read uploaded file and parse it straight from the raw bytes
+            contents = await file.read()
+            try:
+                df = await asyncio.to_thread(read_csv_bytes, contents)
+            except (pa.ArrowInvalid, pa.ArrowKeyError) as e:
+                # Malformed CSV, or a column the pipeline needs is missing
+                raise HTTPException(status_code=400, detail=f"Invalid CSV file: {str(e)}")
+            
+            return await run_batch_prediction(df)
+            
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error processing batch prediction: {str(e)}")
+    
+    @app.post("/predict/batch_arrow")
+    async def predict_batch_arrow(request: Request):
+        """Make batch predictions from an Arrow IPC (Feather) file sent as the body."""
+        try:
+            # Already-parsed data from the client, no CSV parsing needed
+            contents = await request.body()
+            try:
+                df = await asyncio.to_thread(read_arrow_bytes, contents)
+            except pa.ArrowInvalid as e:
+                raise HTTPException(status_code=400, detail=f"Invalid Arrow file: {str(e)}")
+            
+            return await run_batch_prediction(df)
+            
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error processing batch prediction: {str(e)}")
+    
+    @app.get("/sample-csv/download")
+    async def download_sample_csv():
+        """Download a sample CSV file."""
         return Response(
-            content=csv_content,
+            content=SAMPLE_CSV_BYTES,
             media_type="text/csv",
             headers={"Content-Disposition": "attachment; filename=sample_bank_data.csv"}
         )
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error creating sample CSV: {str(e)}")
+    
+    return app
+
+# Default app used by uvicorn (src.api:app)
+app = create_app()
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000, reload=True)
+    # Run as a module (python -m src.api) so the relative imports resolve
+    uvicorn.run("src.api:app", host="0.0.0.0", port=8000, reload=True)
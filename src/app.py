@@ -5,9 +5,11 @@ Clean demo interface with minimal complexity.
 """
 
 import streamlit as st
-import requests
+import httpx
 import pandas as pd
+import pyarrow as pa
 from typing import Dict, Any
+import io
 import os
 
 # Configuration - detect if running in Docker
@@ -19,13 +21,18 @@ if os.getenv('DOCKER_ENV'):
 else:
     API_BASE_URL = "http://localhost:8000"  # Local development
 
+@st.cache_resource
+def get_http_client() -> httpx.Client:
+    """Shared keep-alive HTTP client, reused across Streamlit reruns."""
+    return httpx.Client(base_url=API_BASE_URL, http2=True, timeout=30.0)
+
 def call_prediction_api(data: Dict[str, Any]) -> Dict[str, Any]:
     """Call the API for prediction."""
     try:
-        response = requests.post(f"{API_BASE_URL}/predict", json=data)
+        response = get_http_client().post("/predict", json=data)
         response.raise_for_status()
         return response.json()
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         st.error(f"API call failed: {e}")
         st.error(f"Response status: {getattr(e.response, 'status_code', 'No response')}")
         st.error(f"Response text: {getattr(e.response, 'text', 'No response text')}")
@@ -34,7 +41,7 @@ def call_prediction_api(data: Dict[str, Any]) -> Dict[str, Any]:
 def check_api_health() -> bool:
     """Check if API is running."""
     try:
-        response = requests.get(f"{API_BASE_URL}/health")
+        response = get_http_client().get("/health")
         return response.status_code == 200
     except:
         return False
@@ -187,7 +194,7 @@ def batch_prediction_interface():
     with col2:
         if st.button("📋 Download Sample", type="secondary"):
             try:
-                response = requests.get(f"{API_BASE_URL}/sample-csv/download")
+                response = get_http_client().get("/sample-csv/download")
                 if response.status_code == 200:
                     st.download_button(
                         label="💾 sample_data.csv",
@@ -205,8 +212,6 @@ def batch_prediction_interface():
             st.subheader("📊 Data Preview")
             st.dataframe(df_preview.head(), use_container_width=True)
             st.write(f"Shape: {df_preview.shape[0]} rows × {df_preview.shape[1]} columns")
-            
-            uploaded_file.seek(0)  # Reset file pointer
         except Exception as e:
             st.error(f"Error reading CSV: {e}")
             return
@@ -214,10 +219,10 @@ def batch_prediction_interface():
         # Predict button
         if st.button("🚀 Run Batch Prediction", type="primary"):
             with st.spinner("Processing..."):
-                results = call_batch_prediction_api(uploaded_file)
+                results = call_batch_prediction_api(df_preview)
             
             if results:
-                display_batch_prediction_results(results)
+                display_batch_prediction_results(results, df_preview)
 
 def display_single_prediction_result(result):
     """Display single prediction result."""
@@ -244,10 +249,12 @@ def display_single_prediction_result(result):
     with col3:
         st.metric("Confidence", f"{confidence:.1%}")
 
-def display_batch_prediction_results(results):
+def display_batch_prediction_results(results, input_df):
     """Display batch prediction results."""
     if results and 'predictions' in results:
-        predictions_df = pd.DataFrame(results['predictions'])
+        # Predictions arrive in columnar form: one list per column, plus the
+        # index of the uploaded row each prediction belongs to
+        predictions_df = pd.DataFrame(results['predictions'], index=results['index'])
         
         st.success(f"✅ Processed {results['total_samples']} samples")
         
@@ -292,7 +299,10 @@ def display_batch_prediction_results(results):
         
         # Download results
         st.markdown("---")
-        csv_results = predictions_df.to_csv(index=False)
+        # Replace prediction columns from an earlier run (e.g. a re-uploaded
+        # predictions.csv) rather than clashing with them in the join
+        previous = input_df.columns.intersection(predictions_df.columns)
+        csv_results = input_df.drop(columns=previous).join(predictions_df).to_csv(index=False)
         st.download_button(
             label="📥 Download Results",
             data=csv_results,
@@ -301,15 +311,28 @@ def display_batch_prediction_results(results):
             type="primary"
         )
 
-def call_batch_prediction_api(uploaded_file):
-    """Call batch prediction API."""
+def call_batch_prediction_api(df: pd.DataFrame):
+    """Call batch prediction API with the already-parsed DataFrame."""
     try:
-        uploaded_file.seek(0)
-        files = {"file": (uploaded_file.name, uploaded_file, "text/csv")}
-        response = requests.post(f"{API_BASE_URL}/predict/batch", files=files)
+        # Send as Arrow IPC (Feather) so the API doesn't parse the CSV again
+        buffer = io.BytesIO()
+        try:
+            df.to_feather(buffer)
+        except (pa.ArrowException, ValueError):
+            # Mixed-type columns can't be converted to Arrow; upload as CSV instead
+            response = get_http_client().post(
+                "/predict/batch",
+                files={"file": ("data.csv", df.to_csv(index=False).encode(), "text/csv")}
+            )
+        else:
+            response = get_http_client().post(
+                "/predict/batch_arrow",
+                content=buffer.getvalue(),
+                headers={"Content-Type": "application/vnd.apache.arrow.file"}
+            )
         response.raise_for_status()
         return response.json()
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         st.error(f"API call failed: {e}")
         return None
 
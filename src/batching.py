@@ -0,0 +1,134 @@
+"""
+Micro-Batching for Bank Marketing Prediction
+
+Coalesces concurrent single-prediction requests into one batched model call.
+"""
+
+import asyncio
+import logging
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+class MicroBatcher:
+    """Scores pending predictions together, batching what queues up meanwhile.
+    
+    A request arriving while the batcher is idle is scored straight away;
+    requests arriving while a batch is being scored wait and form the next
+    batch, so batching only kicks in under concurrent load.
+    """
+
+    def __init__(self, predict_many: Callable[[List[Dict[str, Any]]], List[Any]],
+                 lookup: Optional[Callable[[Dict[str, Any]], Optional[Dict[str, Any]]]] = None,
+                 max_batch_size: int = 64):
+        """Initialize with a function that predicts a list of inputs at once.
+        
+        lookup, if given, answers an input without queueing it (e.g. from a
+        cache) and returns None when it can't.
+        """
+        self.predict_many = predict_many
+        self.lookup = lookup
+        self.max_batch_size = max_batch_size
+        self._loop = None
+        self._queue = None
+        self._task = None
+
+    async def start(self):
+        """Start the background task that drains the queue, unless it's running."""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._task is not None and not self._task.done():
+            return
+
+        # The queue belongs to one event loop, so a new loop needs a new one
+        if self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the background task, failing any requests still pending."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        while self._queue is not None and not self._queue.empty():
+            self._fail([self._queue.get_nowait()])
+
+    async def submit(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Return the prediction for one input, queueing it unless lookup has it."""
+        if self.lookup is not None:
+            result = self.lookup(input_data)
+            if result is not None:
+                return result
+
+        # Started here too, for apps whose lifespan never runs (e.g. mounted
+        # as a sub-app or used without a TestClient context)
+        await self.start()
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((input_data, future))
+        return await future
+
+    async def _run(self):
+        """Score whatever is queued, up to max_batch_size at a time."""
+        while True:
+            batch = [await self._queue.get()]
+            try:
+                # No waiting for more: whatever queued up during the previous
+                # batch goes into this one
+                while len(batch) < self.max_batch_size and not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+
+                await self._process(batch)
+            except asyncio.CancelledError:
+                # Stopped mid-batch: don't leave these callers waiting forever
+                self._fail(batch)
+                raise
+
+    @staticmethod
+    def _fail(batch):
+        """Fail every request in the batch that is still waiting."""
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(RuntimeError("Prediction service is shutting down"))
+
+    async def _process(self, batch):
+        """Run one batched prediction and hand each result to its caller.
+        
+        predict_many may return an exception in place of a result (e.g. for
+        an unknown category); that exception goes to its own caller only.
+        """
+        records = [item for item, _ in batch]
+        try:
+            results = await asyncio.to_thread(self.predict_many, records)
+        except Exception as e:
+            if len(batch) == 1:
+                results = [e]
+            else:
+                # One bad input shouldn't fail the others, so retry
+                # individually, in one thread hop, to isolate the error
+                logger.warning(f"Batched prediction of {len(batch)} requests failed, retrying individually")
+                results = await asyncio.to_thread(self._predict_each, records)
+
+        for (_, future), result in zip(batch, results):
+            # Skip callers that went away (e.g. client disconnected)
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def _predict_each(self, records):
+        """Predict records one at a time, returning each one's result or exception."""
+        results = []
+        for record in records:
+            try:
+                results.append(self.predict_many([record])[0])
+            except Exception as e:
+                results.append(e)
+        return results
@@ -0,0 +1,39 @@
+"""
+Forest Export for Bank Marketing Prediction
+
+Flattens the Random Forest of the trained pipeline into .npy arrays that
+the model server memory-maps, so API workers share one copy of the trees.
+The preprocessor is saved alongside, so workers never unpickle the forest.
+"""
+
+import joblib
+import logging
+from pathlib import Path
+
+from .forest_kernel import flatten_forest, save_forest
+from .model_hash import file_sha256
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def export_forest(pipeline_path: str = "models/best_rf_pipeline.pkl",
+                  forest_path: str = "models/forest"):
+    """Write the pipeline's forest as memory-mappable node arrays."""
+    pipeline = joblib.load(pipeline_path)
+    model = pipeline[-1]
+    
+    # The hash ties the export to this pickle, so a retrained pipeline
+    # isn't served with stale trees
+    metadata = {
+        "pipeline_sha256": file_sha256(pipeline_path),
+        "classes": model.classes_.tolist(),
+        "n_features_in": int(model.n_features_in_),
+        "n_trees": len(model.estimators_)
+    }
+    save_forest(flatten_forest(model), forest_path, metadata)
+    joblib.dump(pipeline[:-1], Path(forest_path) / "preprocessor.joblib")
+    logger.info(f"Forest arrays written to {forest_path}")
+
+if __name__ == "__main__":
+    export_forest()
@@ -0,0 +1,43 @@
+"""
+ONNX Export for Bank Marketing Prediction
+
+Converts the Random Forest step of the trained pipeline to ONNX so the
+model server can run it with ONNX Runtime. Preprocessing stays in sklearn.
+"""
+
+import joblib
+import logging
+from skl2onnx import convert_sklearn
+from skl2onnx.common.data_types import FloatTensorType
+
+from .model_hash import file_sha256
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def export_onnx(pipeline_path: str = "models/best_rf_pipeline.pkl",
+                onnx_path: str = "models/best_rf_model.onnx"):
+    """Convert the pipeline's final estimator to an ONNX model file."""
+    pipeline = joblib.load(pipeline_path)
+    model = pipeline[-1]
+    
+    # Plain probability matrix output instead of a list of dicts
+    onnx_model = convert_sklearn(
+        model,
+        initial_types=[("input", FloatTensorType([None, model.n_features_in_]))],
+        options={id(model): {"zipmap": False}}
+    )
+    
+    # Record which pipeline this was exported from, so the model server can
+    # ignore the file once the pipeline is retrained
+    meta = onnx_model.metadata_props.add()
+    meta.key = "pipeline_sha256"
+    meta.value = file_sha256(pipeline_path)
+    
+    with open(onnx_path, "wb") as f:
+        f.write(onnx_model.SerializeToString())
+    logger.info(f"ONNX model written to {onnx_path}")
+
+if __name__ == "__main__":
+    export_onnx()
@@ -0,0 +1,148 @@
+"""
+Numba Forest Kernel for Bank Marketing Prediction
+
+Flattens a fitted random forest into padded node arrays and evaluates it
+with a compiled tree walk, replacing sklearn's per-tree dispatch.
+"""
+
+import json
+import numpy as np
+import threading
+from numba import config, njit, prange, threading_layer
+from pathlib import Path
+
+# The API calls the kernel from several worker threads, so prefer the
+# threadsafe layers, OpenMP first since TBB can hang at interpreter exit
+config.THREADING_LAYER_PRIORITY = ['omp', 'tbb', 'workqueue']
+
+# Without OpenMP or TBB installed Numba falls back to workqueue, which aborts
+# the process if two threads launch the kernel at once; calls are then
+# serialized with this lock
+_kernel_lock = threading.Lock()
+_kernel_threadsafe = False
+
+def flatten_forest(model):
+    """Stack the trees of a fitted forest into rectangular node arrays.
+    
+    Returns (feature, threshold, children_left, children_right, value), each
+    with one row per tree padded to the largest tree. Leaf values are stored
+    as class probabilities, normalized the same way sklearn does.
+    """
+    trees = [estimator.tree_ for estimator in model.estimators_]
+    n_trees = len(trees)
+    max_nodes = max(tree.node_count for tree in trees)
+    n_classes = model.n_classes_
+    
+    feature = np.zeros((n_trees, max_nodes), dtype=np.int32)
+    threshold = np.zeros((n_trees, max_nodes), dtype=np.float64)
+    children_left = np.full((n_trees, max_nodes), -1, dtype=np.int32)
+    children_right = np.full((n_trees, max_nodes), -1, dtype=np.int32)
+    value = np.zeros((n_trees, max_nodes, n_classes), dtype=np.float64)
+    
+    for t, tree in enumerate(trees):
+        n = tree.node_count
+        feature[t, :n] = np.maximum(tree.feature, 0)
+        threshold[t, :n] = tree.threshold
+        children_left[t, :n] = tree.children_left
+        children_right[t, :n] = tree.children_right
+        
+        node_value = tree.value[:, 0, :n_classes]
+        normalizer = node_value.sum(axis=1, keepdims=True)
+        normalizer[normalizer == 0.0] = 1.0
+        value[t, :n] = node_value / normalizer
+    
+    return feature, threshold, children_left, children_right, value
+
+FOREST_ARRAY_NAMES = ("feature", "threshold", "children_left", "children_right", "value")
+
+def save_forest(arrays, directory: str, metadata: dict):
+    """Write flattened forest arrays as one .npy file per array, plus metadata.json."""
+    path = Path(directory)
+    path.mkdir(parents=True, exist_ok=True)
+    for name, array in zip(FOREST_ARRAY_NAMES, arrays):
+        np.save(path / f"{name}.npy", array)
+    with open(path / "metadata.json", "w") as f:
+        json.dump(metadata, f, indent=2)
+
+def load_forest(directory: str):
+    """Memory-map flattened forest arrays written by save_forest.
+    
+    The arrays are read-only views of the files, so every worker process
+    shares the same pages in the OS page cache instead of its own copy.
+    Returns (arrays, metadata).
+    """
+    path = Path(directory)
+    with open(path / "metadata.json") as f:
+        metadata = json.load(f)
+    arrays = tuple(np.load(path / f"{name}.npy", mmap_mode="r") for name in FOREST_ARRAY_NAMES)
+    return arrays, metadata
+
+def check_forest(arrays, n_features: int, n_classes: int, n_trees: int):
+    """Raise ValueError unless the arrays describe a forest of the given shape.
+    
+    The kernel does no bounds checking, so a forest expecting more features
+    than X has would read past the end of it.
+    """
+    feature, threshold, children_left, children_right, value = arrays
+    n_nodes = feature.shape[1]
+    
+    if not (feature.shape == threshold.shape == children_left.shape == children_right.shape == value.shape[:2]):
+        raise ValueError("forest arrays have inconsistent shapes")
+    if feature.shape[0] != n_trees:
+        raise ValueError(f"expected {n_trees} trees, found {feature.shape[0]}")
+    if value.shape[2] != n_classes:
+        raise ValueError(f"expected {n_classes} classes, found {value.shape[2]}")
+    if feature.min() < 0 or feature.max() >= n_features:
+        raise ValueError(f"split features fall outside the {n_features} input features")
+    for children in (children_left, children_right):
+        if children.min() < -1 or children.max() >= n_nodes:
+            raise ValueError("child node indices fall outside the tree arrays")
+
+def forest_predict_proba(X, feature, threshold, children_left, children_right, value, block_size=256):
+    """Average the leaf class probabilities of every tree for each row of X.
+    
+    Safe to call from several threads: calls are serialized until the first
+    one shows which threading layer Numba picked, and for good on workqueue.
+    """
+    global _kernel_threadsafe
+    arrays = (feature, threshold, children_left, children_right, value)
+    if _kernel_threadsafe:
+        return _forest_predict_proba(X, *arrays, block_size)
+    
+    with _kernel_lock:
+        out = _forest_predict_proba(X, *arrays, block_size)
+        _kernel_threadsafe = threading_layer() != 'workqueue'
+    return out
+
+@njit(parallel=True, nogil=True, cache=True)
+def _forest_predict_proba(X, feature, threshold, children_left, children_right, value, block_size):
+    """Compiled kernel behind forest_predict_proba.
+    
+    Rows are processed in blocks, walking one tree over the whole block
+    before moving on, so each tree stays in cache; blocks run in parallel.
+    """
+    n_samples = X.shape[0]
+    n_trees = feature.shape[0]
+    n_classes = value.shape[2]
+    out = np.zeros((n_samples, n_classes))
+    n_blocks = (n_samples + block_size - 1) // block_size
+    
+    for b in prange(n_blocks):
+        start = b * block_size
+        stop = min(start + block_size, n_samples)
+        for t in range(n_trees):
+            for i in range(start, stop):
+                node = 0
+                while children_left[t, node] != -1:
+                    if X[i, feature[t, node]] <= threshold[t, node]:
+                        node = children_left[t, node]
+                    else:
+                        node = children_right[t, node]
+                for c in range(n_classes):
+                    out[i, c] += value[t, node, c]
+    
+    for i in range(n_samples):
+        for c in range(n_classes):
+            out[i, c] /= n_trees
+    
+    return out
@@ -0,0 +1,15 @@
+"""
+Model File Hashing for Bank Marketing Prediction
+
+Fingerprints the trained pipeline so exported models can be matched to it.
+"""
+
+import hashlib
+
+def file_sha256(path: str) -> str:
+    """Return the SHA-256 hex digest of a file, read in 1 MB chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
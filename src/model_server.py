@@ -7,10 +7,19 @@ Loads and serves predictions from a sklearn pipeline.
 import joblib
 import pandas as pd
 import numpy as np
-from typing import Dict, Any
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.impute import SimpleImputer
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import FunctionTransformer, OneHotEncoder, StandardScaler
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
 import logging
+import threading
 from pathlib import Path
 
+from .forest_kernel import check_forest, flatten_forest, forest_predict_proba, load_forest
+from .model_hash import file_sha256
+
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -18,38 +27,407 @@ logger = logging.getLogger(__name__)
 class BankMarketingPredictor:
     """Simple predictor using sklearn pipeline."""
     
-    def __init__(self, pipeline_path: str = "models/best_rf_pipeline.pkl"):
+    def __init__(self, pipeline_path: str = "models/best_rf_pipeline.pkl",
+                 onnx_path: str = "models/best_rf_model.onnx",
+                 forest_path: str = "models/forest", cache_size: int = 4096):
         """Initialize with the sklearn pipeline."""
         self.pipeline_path = pipeline_path
+        self.onnx_path = onnx_path
+        self.forest_path = forest_path
         self.pipeline = None
+        self._pipeline_sha256 = None
+        self._preprocessor = None
+        self._model = None
+        self._classes = None
+        self._n_features_in = None
+        self._onnx_session = None
+        self._forest_arrays = None
+        self._columns = None
+        self._numeric_plan = None
+        self._categorical_plan = None
+        self._n_features = None
+        self._scratch = None
+        self._scratch_lock = threading.Lock()
+        self._labels = np.array(['no', 'yes'], dtype=object)
         self._load_pipeline()
+        self._init_scratch()
+        self._init_row_encoder()
+        
+        # LRU cache of results keyed by row, so repeated inputs (retries,
+        # demo traffic) skip the pipeline entirely
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+        self._cache_lock = threading.Lock()
+    
+    @property
+    def input_columns(self) -> List[str]:
+        """Input columns the pipeline uses, in its order."""
+        return list(self._columns)
     
     def _load_pipeline(self):
         """Load the trained sklearn pipeline."""
         try:
+            # Run the forest with ONNX Runtime when a valid exported model exists
+            if Path(self.onnx_path).exists():
+                self._onnx_session = self._load_onnx_session()
+            
+            # Otherwise, with exported forest arrays the pickled trees aren't
+            # needed: memory-map the arrays so workers share one copy of them
+            if self._onnx_session is None and Path(self.forest_path).exists() and self._load_forest_export():
+                self._warm_up_kernel()
+                return
+            
             self.pipeline = joblib.load(self.pipeline_path)
+            
+            # Split so the preprocessing runs once per call, not once for
+            # predict() and again for predict_proba()
+            self._preprocessor = self.pipeline[:-1]
+            self._model = self.pipeline[-1]
+            self._classes = self._model.classes_
+            self._n_features_in = self._model.n_features_in_
             logger.info(f"Pipeline loaded successfully from {self.pipeline_path}")
+            
+            if self._onnx_session is None and isinstance(self._model, RandomForestClassifier):
+                # Otherwise walk the trees with the compiled Numba kernel
+                self._forest_arrays = flatten_forest(self._model)
+                self._warm_up_kernel()
+            
+            if self._onnx_session is not None or self._forest_arrays is not None:
+                # The trees now live in ONNX Runtime or the flattened arrays,
+                # so drop sklearn's copy of them
+                self.pipeline = None
+                self._model = None
         except Exception as e:
             logger.error(f"Error loading pipeline: {e}")
             raise
     
-    def predict(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Make a prediction on input data."""
+    def _pipeline_hash(self) -> str:
+        """SHA-256 of the pipeline pickle, computed only once an export needs checking."""
+        if self._pipeline_sha256 is None:
+            self._pipeline_sha256 = file_sha256(self.pipeline_path)
+        return self._pipeline_sha256
+    
+    def _load_forest_export(self) -> bool:
+        """Load the preprocessor and memory-mapped forest written by export_forest.
+        
+        Returns False, so the full pipeline is loaded instead, if the export
+        was made from a different pipeline or its arrays don't check out.
+        """
         try:
-            # Convert input to DataFrame
-            df = pd.DataFrame([input_data])
+            forest_arrays, metadata = load_forest(self.forest_path)
+            if metadata["pipeline_sha256"] != self._pipeline_hash():
+                logger.warning(f"Ignoring stale forest arrays in {self.forest_path} (exported from a different pipeline), re-run make export-forest")
+                return False
+            check_forest(forest_arrays, metadata["n_features_in"], len(metadata["classes"]), metadata["n_trees"])
+            self._preprocessor = joblib.load(Path(self.forest_path) / "preprocessor.joblib")
+        except Exception as e:
+            logger.warning(f"Ignoring forest arrays in {self.forest_path}: {e}")
+            return False
+        
+        self._forest_arrays = forest_arrays
+        self._classes = np.array(metadata["classes"])
+        self._n_features_in = metadata["n_features_in"]
+        logger.info(f"Forest arrays memory-mapped from {self.forest_path}")
+        return True
+    
+    def _load_onnx_session(self):
+        """Open the exported ONNX model, unless it was exported from another pipeline."""
+        # Optional dependency (the onnx extra), only needed once a model has been exported
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            logger.warning(f"Ignoring ONNX model {self.onnx_path}: onnxruntime is not installed (uv sync --extra onnx)")
+            return None
+        
+        try:
+            session = ort.InferenceSession(self.onnx_path, providers=["CPUExecutionProvider"])
+        except Exception as e:
+            logger.warning(f"Ignoring ONNX model {self.onnx_path}: {e}")
+            return None
+        exported_from = session.get_modelmeta().custom_metadata_map.get("pipeline_sha256")
+        if exported_from != self._pipeline_hash():
+            logger.warning(f"Ignoring stale ONNX model {self.onnx_path} (exported from a different pipeline), re-run make export-onnx")
+            return None
+        
+        logger.info(f"ONNX model loaded successfully from {self.onnx_path}")
+        return session
+    
+    def _warm_up_kernel(self):
+        """Compile (or load from cache) the Numba kernel before the first request."""
+        try:
+            dummy = np.zeros((1, self._n_features_in), dtype=np.float32)
+            forest_predict_proba(dummy, *self._forest_arrays)
+            logger.info("Numba forest kernel warmed up")
+        except Exception as e:
+            logger.warning(f"Numba forest kernel warmup failed: {e}")
+    
+    def _init_scratch(self):
+        """Preallocate a reusable one-row frame in the pipeline's column order."""
+        preprocessor = self._preprocessor.named_steps['preprocessor']
+        self._columns = list(preprocessor.feature_names_in_)
+        
+        # One-hot encoded columns hold strings, everything else is numeric
+        categorical = set()
+        for _, transformer, columns in preprocessor.transformers_:
+            if isinstance(transformer, OneHotEncoder):
+                categorical.update(columns)
+        
+        self._scratch = pd.DataFrame({
+            col: pd.Series([None], dtype=object) if col in categorical
+            else pd.Series([np.nan], dtype=np.float64)
+            for col in self._columns
+        })
+    
+    def _init_row_encoder(self):
+        """Precompute lookups that reproduce the preprocessor for a single row.
+        
+        Categorical values map straight to their one-hot output position and
+        numeric columns get a short list of imputation/function/scaling steps,
+        so single predictions skip the ColumnTransformer entirely. Falls back
+        to the preallocated frame if the preprocessor has an unsupported step.
+        """
+        preprocessor = self._preprocessor.named_steps['preprocessor']
+        column_index = {col: i for i, col in enumerate(self._columns)}
+        numeric_plan = []
+        categorical_plan = []
+        
+        for name, transformer, columns in preprocessor.transformers_:
+            if transformer == 'drop' or len(columns) == 0:
+                continue
+            offset = preprocessor.output_indices_[name].start
             
-            # Make prediction using the pipeline
-            prediction = self.pipeline.predict(df)[0]
-            prediction_proba = self.pipeline.predict_proba(df)[0]
+            if isinstance(transformer, OneHotEncoder):
+                if transformer.handle_unknown != 'error' or transformer._infrequent_enabled:
+                    logger.info("Unsupported one-hot encoder settings, using DataFrame path")
+                    return
+                for i, col in enumerate(columns):
+                    categories = transformer.categories_[i]
+                    drop_idx = None if transformer.drop_idx_ is None else transformer.drop_idx_[i]
+                    mapping = {}
+                    for j, category in enumerate(categories):
+                        if j == drop_idx:
+                            mapping[category] = None
+                        else:
+                            mapping[category] = offset
+                            offset += 1
+                    categorical_plan.append((column_index[col], col, mapping))
+                continue
             
-            return {
-                "prediction": int(prediction),
+            steps = self._numeric_steps(transformer, len(columns))
+            if steps is None:
+                logger.info(f"Unsupported transformer '{name}', using DataFrame path")
+                return
+            for i, col in enumerate(columns):
+                numeric_plan.append((column_index[col], offset + i, steps[i]))
+        
+        self._numeric_plan = numeric_plan
+        self._categorical_plan = categorical_plan
+        self._n_features = max(s.stop for s in preprocessor.output_indices_.values())
+    
+    @staticmethod
+    def _numeric_steps(transformer, n_columns: int):
+        """Flatten a numeric transformer into per-column (op, a, b) steps."""
+        if transformer == 'passthrough':
+            return [[] for _ in range(n_columns)]
+        
+        if isinstance(transformer, Pipeline):
+            transformers = [step for _, step in transformer.steps]
+        else:
+            transformers = [transformer]
+        
+        steps = [[] for _ in range(n_columns)]
+        for step in transformers:
+            if isinstance(step, SimpleImputer) and not step.add_indicator:
+                for i in range(n_columns):
+                    steps[i].append(("impute", step.missing_values, float(step.statistics_[i])))
+            elif isinstance(step, FunctionTransformer) and isinstance(step.func, np.ufunc) and not step.kw_args:
+                for i in range(n_columns):
+                    steps[i].append(("apply", step.func, None))
+            elif isinstance(step, StandardScaler):
+                for i in range(n_columns):
+                    # mean_ is fitted even with with_mean=False, but not applied
+                    mean = float(step.mean_[i]) if step.with_mean else 0.0
+                    scale = float(step.scale_[i]) if step.with_std else 1.0
+                    steps[i].append(("scale", mean, scale))
+            else:
+                return None
+        return steps
+    
+    def _encode_rows(self, rows: List[tuple], errors: Optional[Dict[int, Exception]] = None) -> np.ndarray:
+        """Build the preprocessed feature matrix for rows from the lookups.
+        
+        If errors is given, a row that can't be encoded (e.g. an unknown
+        category) is recorded there by position instead of raising.
+        """
+        features = np.zeros((len(rows), self._n_features))
+        
+        for j, (out, row) in enumerate(zip(features, rows)):
+            try:
+                self._encode_row(out, row)
+            except Exception as e:
+                if errors is None:
+                    raise
+                errors[j] = e
+        
+        return features
+    
+    def _encode_row(self, out: np.ndarray, row: tuple):
+        """Write one row's preprocessed features into out."""
+        for in_idx, out_idx, steps in self._numeric_plan:
+            value = float(row[in_idx])
+            for op, a, b in steps:
+                if op == "impute":
+                    if value == a or (a != a and value != value):
+                        value = b
+                elif op == "apply":
+                    value = a(value)
+                else:
+                    value = (value - a) / b
+            out[out_idx] = value
+        
+        for in_idx, col, mapping in self._categorical_plan:
+            value = row[in_idx]
+            if value not in mapping:
+                raise ValueError(f"Found unknown category {value!r} in column '{col}'")
+            out_idx = mapping[value]
+            if out_idx is not None:
+                out[out_idx] = 1.0
+    
+    def _preprocess_rows(self, rows: List[tuple], errors: Optional[Dict[int, Exception]] = None) -> np.ndarray:
+        """Preprocess rows given in pipeline column order.
+        
+        errors is only filled on the lookup path; the DataFrame path raises.
+        """
+        if self._numeric_plan is not None:
+            return self._encode_rows(rows, errors)
+        
+        if len(rows) == 1:
+            # Use the preallocated frame, locked since the API may call
+            # predict() from several threads
+            with self._scratch_lock:
+                self._scratch.iloc[0, :] = list(rows[0])
+                return self._preprocessor.transform(self._scratch)
+        
+        return self._preprocessor.transform(pd.DataFrame(rows, columns=self._columns))
+    
+    def _predict_features(self, features: np.ndarray):
+        """Return predicted classes and class probabilities for preprocessed features."""
+        if self._onnx_session is not None:
+            prediction_probas = self._onnx_session.run(
+                ["probabilities"], {"input": features.astype(np.float32)}
+            )[0]
+        elif self._forest_arrays is not None:
+            # float32 inputs like sklearn's own trees, so splits match exactly
+            prediction_probas = forest_predict_proba(
+                features.astype(np.float32), *self._forest_arrays
+            )
+        else:
+            prediction_probas = self._model.predict_proba(features)
+        
+        # Same rule the classifier's own predict() uses
+        predictions = self._classes[prediction_probas.argmax(axis=1)]
+        
+        # float32 is plenty for probabilities and halves what gets serialized
+        prediction_probas = prediction_probas.astype(np.float32, copy=False)
+        return predictions, prediction_probas
+    
+    def _predict_with_proba(self, input_df: pd.DataFrame):
+        """Return predicted classes and class probabilities for a DataFrame."""
+        return self._predict_features(self._preprocessor.transform(input_df))
+    
+    def cached_prediction(self, input_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Return the cached result for an input, or None if it isn't cached."""
+        try:
+            row = tuple(input_data[col] for col in self._columns)
+        except KeyError:
+            return None
+        
+        with self._cache_lock:
+            cached = self._cache.get(row)
+            if cached is None:
+                return None
+            self._cache.move_to_end(row)
+        
+        # Copy so callers can't modify the cached result
+        return dict(cached)
+    
+    def _score_rows(self, rows: List[tuple], errors: Optional[Dict[int, Exception]] = None) -> List[Dict[str, Any]]:
+        """Score rows in one batch, returning a result dict per row."""
+        features = self._preprocess_rows(rows, errors)
+        predictions, prediction_probas = self._predict_features(features)
+        
+        # Values stay numpy scalars; the API serializes them with orjson
+        return [
+            {
+                "prediction": prediction,
                 "prediction_label": "yes" if prediction == 1 else "no",
-                "probability_no": float(prediction_proba[0]),
-                "probability_yes": float(prediction_proba[1]),
-                "confidence": float(max(prediction_proba))
+                "probability_no": prediction_proba[0],
+                "probability_yes": prediction_proba[1],
+                "confidence": prediction_proba.max()
             }
+            for prediction, prediction_proba in zip(predictions, prediction_probas)
+        ]
+    
+    def _score_rows_isolated(self, rows: List[tuple]) -> List[Any]:
+        """Score rows, giving any row that fails its exception in place of a result."""
+        errors = {}
+        try:
+            scored = self._score_rows(rows, errors)
+        except Exception as e:
+            if len(rows) == 1:
+                return [e]
+            # Only the DataFrame path fails as a whole; score rows one by one
+            # to find the bad ones
+            return [self._score_rows_isolated([row])[0] for row in rows]
+        
+        for j, error in errors.items():
+            scored[j] = error
+        return scored
+    
+    def predict_many(self, records: List[Dict[str, Any]], return_exceptions: bool = False) -> List[Any]:
+        """Make predictions for several inputs in one pipeline call.
+        
+        Cached inputs are answered from the LRU cache; the rest are
+        preprocessed and scored together as a single batch. With
+        return_exceptions, an input that can't be scored (e.g. an unknown
+        category) gets its exception in place of a result instead of
+        failing the whole call.
+        """
+        rows = [tuple(record[col] for col in self._columns) for record in records]
+        results = [None] * len(rows)
+        missing = []
+        
+        with self._cache_lock:
+            for i, row in enumerate(rows):
+                cached = self._cache.get(row)
+                if cached is None:
+                    missing.append(i)
+                else:
+                    self._cache.move_to_end(row)
+                    results[i] = cached
+        
+        if missing:
+            missing_rows = [rows[i] for i in missing]
+            if return_exceptions:
+                scored = self._score_rows_isolated(missing_rows)
+            else:
+                scored = self._score_rows(missing_rows)
+            
+            with self._cache_lock:
+                for i, result in zip(missing, scored):
+                    results[i] = result
+                    if not isinstance(result, Exception):
+                        self._cache[rows[i]] = result
+                while len(self._cache) > self._cache_size:
+                    self._cache.popitem(last=False)
+        
+        # Copy so callers can't modify the cached results
+        return [result if isinstance(result, Exception) else dict(result) for result in results]
+    
+    def predict(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Make a prediction on input data."""
+        try:
+            return self.predict_many([input_data])[0]
             
         except Exception as e:
             logger.error(f"Error making prediction: {e}")
@@ -61,16 +439,17 @@ class BankMarketingPredictor:
             logger.info(f"Processing batch prediction for {len(input_df)} samples")
             
             # Make predictions using the pipeline
-            predictions = self.pipeline.predict(input_df)
-            prediction_probas = self.pipeline.predict_proba(input_df)
+            predictions, prediction_probas = self._predict_with_proba(input_df)
             
-            # Create results DataFrame
-            results_df = input_df.copy()
-            results_df['prediction'] = predictions
-            results_df['prediction_label'] = ['yes' if p == 1 else 'no' for p in predictions]
-            results_df['probability_no'] = prediction_probas[:, 0]
-            results_df['probability_yes'] = prediction_probas[:, 1]
-            results_df['confidence'] = np.max(prediction_probas, axis=1)
+            # Results hold only the output columns, aligned on the input index,
+            # so the (possibly large) input frame is never duplicated
+            results_df = pd.DataFrame({
+                'prediction': predictions,
+                'prediction_label': self._labels[predictions.astype(np.intp)],
+                'probability_no': prediction_probas[:, 0],
+                'probability_yes': prediction_probas[:, 1],
+                'confidence': prediction_probas.max(axis=1)
+            }, index=input_df.index)
             
             logger.info(f"Batch prediction completed successfully")
             return results_df
@@ -0,0 +1,85 @@
+"""
+API Tests for Bank Marketing Prediction
+
+Request validation of /predict in both app variants, and batch CSV parsing.
+"""
+
+import pandas as pd
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.api import SAMPLE_DATA, create_app
+
+SAMPLE_ROW = {column: values[0] for column, values in SAMPLE_DATA.items()}
+
+@pytest.fixture(scope="module", params=[True, False], ids=["strict", "lax"])
+def strict_validation(request):
+    """Each validation mode of the app."""
+    return request.param
+
+@pytest.fixture(scope="module")
+def client(strict_validation):
+    """Test client for the validation mode, with the app's lifespan running."""
+    with TestClient(create_app(strict_validation=strict_validation)) as client:
+        yield client
+
+def test_predict_accepts_valid_request(client):
+    response = client.post("/predict", json=SAMPLE_ROW)
+    
+    assert response.status_code == 200
+    assert response.json()["prediction_label"] in ("yes", "no")
+
+@pytest.mark.parametrize("payload", [
+    dict(SAMPLE_ROW, age="35"),
+    dict(SAMPLE_ROW, customer_id=7),
+], ids=["numeric_string", "extra_field"])
+def test_predict_leniency_depends_on_mode(client, strict_validation, payload):
+    # Only the lax app coerces numeric strings and ignores unknown fields
+    response = client.post("/predict", json=payload)
+    
+    assert response.status_code == (422 if strict_validation else 200)
+
+def test_predict_works_without_lifespan():
+    # Outside a with block TestClient never runs the app's lifespan
+    client = TestClient(create_app())
+    
+    for _ in range(2):
+        assert client.post("/predict", json=SAMPLE_ROW).status_code == 200
+
+def test_predict_works_in_mounted_app():
+    # Starlette doesn't run the lifespan of mounted apps either
+    parent = FastAPI()
+    parent.mount("/api", create_app())
+    
+    with TestClient(parent) as client:
+        assert client.post("/api/predict", json=SAMPLE_ROW).status_code == 200
+
+@pytest.mark.parametrize("payload", [
+    {column: value for column, value in SAMPLE_ROW.items() if column != "occupation"},
+    dict(SAMPLE_ROW, age=[35]),
+    dict(SAMPLE_ROW, month={"name": "may"}),
+], ids=["missing_field", "list_value", "object_value"])
+def test_predict_rejects_invalid_request(client, payload):
+    response = client.post("/predict", json=payload)
+    
+    assert response.status_code == 422
+
+def test_batch_csv_ignores_unused_columns():
+    csv = pd.DataFrame(SAMPLE_DATA).assign(notes=["a", 1, "x"]).to_csv(index=False).encode()
+    
+    with TestClient(create_app()) as client:
+        response = client.post("/predict/batch", files={"file": ("data.csv", csv, "text/csv")})
+    
+    assert response.status_code == 200
+    assert set(response.json()["predictions"]) == {
+        "prediction", "prediction_label", "probability_no", "probability_yes", "confidence"
+    }
+
+def test_batch_csv_missing_column_is_rejected():
+    csv = pd.DataFrame(SAMPLE_DATA).drop(columns=["age"]).to_csv(index=False).encode()
+    
+    with TestClient(create_app()) as client:
+        response = client.post("/predict/batch", files={"file": ("data.csv", csv, "text/csv")})
+    
+    assert response.status_code == 400
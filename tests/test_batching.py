@@ -0,0 +1,171 @@
+"""
+Micro-Batching Tests for Bank Marketing Prediction
+
+Exercises MicroBatcher with stand-in predict functions instead of the model.
+"""
+
+import asyncio
+import threading
+
+from src.batching import MicroBatcher
+
+def echo_predict_many(calls):
+    """predict_many stand-in that records each batch and fails on "bad" inputs."""
+    def predict_many(records):
+        calls.append(list(records))
+        if "bad" in records:
+            raise ValueError("bad input")
+        return [{"input": record} for record in records]
+    return predict_many
+
+def run_batcher(predict_many, items, **kwargs):
+    """Submit items concurrently to a started MicroBatcher and return the results.
+    
+    Failed requests return their exception instead of raising.
+    """
+    async def main():
+        batcher = MicroBatcher(predict_many, **kwargs)
+        await batcher.start()
+        results = await asyncio.gather(*[batcher.submit(item) for item in items], return_exceptions=True)
+        await batcher.stop()
+        return results
+    
+    return asyncio.run(main())
+
+def test_concurrent_requests_share_one_batch():
+    calls = []
+    
+    results = run_batcher(echo_predict_many(calls), range(10))
+    
+    assert calls == [list(range(10))]
+    assert results == [{"input": i} for i in range(10)]
+
+def test_batches_are_capped_at_max_batch_size():
+    calls = []
+    
+    run_batcher(echo_predict_many(calls), range(10), max_batch_size=4)
+    
+    assert [len(batch) for batch in calls] == [4, 4, 2]
+
+def test_failed_batch_is_retried_per_request():
+    calls = []
+    
+    first, second, third = run_batcher(echo_predict_many(calls), ["a", "bad", "b"])
+    
+    # Only the bad input fails; the others are answered by the retries
+    assert first == {"input": "a"}
+    assert isinstance(second, ValueError)
+    assert third == {"input": "b"}
+    assert calls == [["a", "bad", "b"], ["a"], ["bad"], ["b"]]
+
+def test_single_failed_request_is_not_retried():
+    calls = []
+    
+    [result] = run_batcher(echo_predict_many(calls), ["bad"])
+    
+    assert isinstance(result, ValueError)
+    assert calls == [["bad"]]
+
+def test_per_row_exceptions_go_to_their_own_caller():
+    calls = []
+    
+    def predict_many(records):
+        calls.append(list(records))
+        return [ValueError("bad input") if record == "bad" else {"input": record} for record in records]
+    
+    first, second, third = run_batcher(predict_many, ["a", "bad", "b"])
+    
+    assert first == {"input": "a"}
+    assert isinstance(second, ValueError)
+    assert third == {"input": "b"}
+    assert calls == [["a", "bad", "b"]]
+
+def test_cancelled_request_does_not_affect_others():
+    calls = []
+    
+    async def main():
+        batcher = MicroBatcher(echo_predict_many(calls))
+        await batcher.start()
+        cancelled = asyncio.create_task(batcher.submit("gone"))
+        kept = asyncio.create_task(batcher.submit("kept"))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        result = await kept
+        await batcher.stop()
+        return cancelled, result
+    
+    cancelled, result = asyncio.run(main())
+    
+    assert cancelled.cancelled()
+    assert result == {"input": "kept"}
+
+def test_stop_fails_pending_requests():
+    release = threading.Event()
+    
+    def blocking_predict_many(records):
+        release.wait(5)
+        return [{"input": record} for record in records]
+    
+    async def main():
+        batcher = MicroBatcher(blocking_predict_many, max_batch_size=1)
+        await batcher.start()
+        in_flight = asyncio.create_task(batcher.submit("in flight"))
+        await asyncio.sleep(0.05)
+        queued = asyncio.create_task(batcher.submit("queued"))
+        await asyncio.sleep(0)
+        await batcher.stop()
+        release.set()
+        return await asyncio.gather(in_flight, queued, return_exceptions=True)
+    
+    results = asyncio.run(main())
+    
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+def test_submit_starts_batcher_without_start():
+    calls = []
+    batcher = MicroBatcher(echo_predict_many(calls))
+    
+    async def main():
+        return await batcher.submit("x")
+    
+    # Each asyncio.run is a new event loop, as with TestClient outside a with block
+    results = [asyncio.run(main()) for _ in range(2)]
+    
+    assert results == [{"input": "x"}, {"input": "x"}]
+
+def test_lookup_hits_skip_the_queue():
+    calls = []
+    
+    results = run_batcher(
+        echo_predict_many(calls), ["hit", "miss"],
+        lookup=lambda item: {"cached": item} if item == "hit" else None
+    )
+    
+    assert results == [{"cached": "hit"}, {"input": "miss"}]
+    assert calls == [["miss"]]
+
+def test_requests_arriving_during_a_batch_form_the_next_one():
+    calls = []
+    release = threading.Event()
+    predict_many = echo_predict_many(calls)
+    
+    def slow_predict_many(records):
+        release.wait(5)
+        return predict_many(records)
+    
+    async def main():
+        batcher = MicroBatcher(slow_predict_many)
+        first = asyncio.create_task(batcher.submit(0))
+        await asyncio.sleep(0.05)
+        rest = [asyncio.create_task(batcher.submit(i)) for i in range(1, 6)]
+        await asyncio.sleep(0.05)
+        release.set()
+        results = await asyncio.gather(first, *rest)
+        await batcher.stop()
+        return results
+    
+    results = asyncio.run(main())
+    
+    # The lone first request didn't wait for company
+    assert calls == [[0], [1, 2, 3, 4, 5]]
+    assert results == [{"input": i} for i in range(6)]
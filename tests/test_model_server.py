@@ -0,0 +1,169 @@
+"""
+Equivalence Tests for Bank Marketing Prediction
+
+The model server re-implements the preprocessing and Random Forest scoring
+for speed; these check it still agrees with the sklearn pipeline.
+"""
+
+import json
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.export_forest import export_forest
+from src.forest_kernel import check_forest, load_forest
+from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+from src.model_server import BankMarketingPredictor, predictor
+
+DATA_PATH = "data/bank_data_raw.csv"
+N_SINGLE_ROWS = 5000
+
+@pytest.fixture(scope="module")
+def data():
+    """Raw dataset without the target column."""
+    return pd.read_csv(DATA_PATH).drop(columns=["target"])
+
+@pytest.fixture(scope="module")
+def reference(data):
+    """Classes and probabilities from the sklearn pipeline itself."""
+    pipeline = joblib.load(predictor.pipeline_path)
+    return pipeline.predict(data), pipeline.predict_proba(data)
+
+def test_predict_batch_matches_pipeline(data, reference):
+    expected_classes, expected_probas = reference
+    results = predictor.predict_batch(data)
+    
+    assert results.index.equals(data.index)
+    np.testing.assert_array_equal(results["prediction"].to_numpy(), expected_classes)
+    np.testing.assert_allclose(results["probability_no"], expected_probas[:, 0], atol=1e-6)
+    np.testing.assert_allclose(results["probability_yes"], expected_probas[:, 1], atol=1e-6)
+    np.testing.assert_allclose(results["confidence"], expected_probas.max(axis=1), atol=1e-6)
+
+def test_predict_many_matches_pipeline(data, reference):
+    expected_classes, expected_probas = reference
+    records = data.head(N_SINGLE_ROWS).to_dict("records")
+    results = predictor.predict_many(records)
+    
+    np.testing.assert_array_equal([r["prediction"] for r in results], expected_classes[:N_SINGLE_ROWS])
+    np.testing.assert_allclose([r["probability_no"] for r in results], expected_probas[:N_SINGLE_ROWS, 0], atol=1e-6)
+    np.testing.assert_allclose([r["probability_yes"] for r in results], expected_probas[:N_SINGLE_ROWS, 1], atol=1e-6)
+    assert [r["prediction_label"] for r in results] == ["yes" if c == 1 else "no" for c in expected_classes[:N_SINGLE_ROWS]]
+
+@pytest.fixture(scope="module")
+def forest_path(tmp_path_factory):
+    """Forest arrays exported from the trained pipeline."""
+    path = tmp_path_factory.mktemp("forest")
+    export_forest(predictor.pipeline_path, str(path))
+    return path
+
+def test_exported_forest_matches_pipeline(data, reference, forest_path):
+    expected_classes, expected_probas = reference
+    exported = BankMarketingPredictor(onnx_path="missing.onnx", forest_path=str(forest_path))
+    results = exported.predict_batch(data)
+    
+    # Served from the memory-mapped arrays, without unpickling the forest
+    assert exported._model is None
+    assert isinstance(exported._forest_arrays[0], np.memmap)
+    np.testing.assert_array_equal(results["prediction"].to_numpy(), expected_classes)
+    np.testing.assert_allclose(results["probability_yes"], expected_probas[:, 1], atol=1e-6)
+
+def test_stale_forest_export_is_ignored(data, reference, forest_path, tmp_path):
+    expected_classes, expected_probas = reference
+    stale_path = tmp_path / "forest"
+    stale_path.mkdir()
+    for file in forest_path.iterdir():
+        (stale_path / file.name).write_bytes(file.read_bytes())
+    metadata = json.loads((stale_path / "metadata.json").read_text())
+    metadata["pipeline_sha256"] = "0" * 64
+    (stale_path / "metadata.json").write_text(json.dumps(metadata))
+    
+    stale = BankMarketingPredictor(onnx_path="missing.onnx", forest_path=str(stale_path))
+    results = stale.predict_batch(data)
+    
+    assert not isinstance(stale._forest_arrays[0], np.memmap)
+    np.testing.assert_allclose(results["probability_yes"], expected_probas[:, 1], atol=1e-6)
+
+def test_unusable_onnx_model_falls_back_to_forest_export(data, reference, forest_path, tmp_path):
+    expected_classes, expected_probas = reference
+    onnx_path = tmp_path / "model.onnx"
+    onnx_path.write_bytes(b"not an onnx model")
+    
+    fallback = BankMarketingPredictor(onnx_path=str(onnx_path), forest_path=str(forest_path))
+    results = fallback.predict_batch(data)
+    
+    # A rejected ONNX file must not cost the memory-mapped export
+    assert fallback._onnx_session is None
+    assert isinstance(fallback._forest_arrays[0], np.memmap)
+    np.testing.assert_allclose(results["probability_yes"], expected_probas[:, 1], atol=1e-6)
+
+def test_check_forest_rejects_out_of_range_features(forest_path):
+    arrays, metadata = load_forest(str(forest_path))
+    with pytest.raises(ValueError, match="input features"):
+        # One fewer input than the highest split feature needs
+        check_forest(arrays, int(arrays[0].max()), len(metadata["classes"]), metadata["n_trees"])
+
+def test_row_encoder_honors_scaler_options(tmp_path):
+    # Non-default StandardScaler options: mean_ is still fitted with
+    # with_mean=False, but must not be subtracted
+    train = pd.DataFrame({
+        "a": [1.0, 2.0, 3.0, 6.0],
+        "b": [10.0, 0.0, 5.0, 1.0],
+        "c": ["x", "y", "x", "z"],
+    })
+    pipeline = Pipeline([
+        ("preprocessor", ColumnTransformer([
+            ("no_mean", StandardScaler(with_mean=False), ["a"]),
+            ("no_std", StandardScaler(with_std=False), ["b"]),
+            ("cat", OneHotEncoder(drop="first"), ["c"]),
+        ])),
+        ("model", RandomForestClassifier(n_estimators=5, random_state=0)),
+    ])
+    pipeline.fit(train, [0, 1, 0, 1])
+    pipeline_path = tmp_path / "pipeline.pkl"
+    joblib.dump(pipeline, pipeline_path)
+    
+    small = BankMarketingPredictor(
+        pipeline_path=str(pipeline_path),
+        onnx_path=str(tmp_path / "missing.onnx"),
+        forest_path=str(tmp_path / "missing")
+    )
+    rows = list(train.itertuples(index=False, name=None))
+    
+    assert small._numeric_plan is not None
+    np.testing.assert_allclose(small._encode_rows(rows), pipeline[:-1].transform(train))
+    np.testing.assert_allclose(
+        [r["probability_yes"] for r in small.predict_many(train.to_dict("records"))],
+        pipeline.predict_proba(train)[:, 1], atol=1e-6
+    )
+
+def test_predict_many_rejects_unknown_category(data):
+    record = dict(data.iloc[0], month="not-a-month")
+    with pytest.raises(ValueError, match="unknown category"):
+        predictor.predict_many([record])
+
+def test_predict_many_returns_per_row_exceptions(data, reference):
+    records = data.iloc[:3].to_dict("records")
+    records[1] = dict(records[1], month="not-a-month")
+    
+    results = predictor.predict_many(records, return_exceptions=True)
+    
+    assert isinstance(results[1], ValueError)
+    np.testing.assert_allclose(
+        [results[0]["probability_yes"], results[2]["probability_yes"]],
+        reference[1][[0, 2], 1], atol=1e-6
+    )
+    # The bad row isn't cached
+    assert predictor.cached_prediction(records[1]) is None
+
+def test_pipeline_is_not_hashed_without_exports(tmp_path):
+    plain = BankMarketingPredictor(
+        onnx_path=str(tmp_path / "missing.onnx"),
+        forest_path=str(tmp_path / "missing")
+    )
+    
+    assert plain._pipeline_sha256 is None